@@ -1,18 +1,86 @@
 # scraper.py - Kibana scraper with integrated login and full debugging
 import os
+import time
+import random
 import asyncio
+import hashlib
+import httpx
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from playwright.async_api import async_playwright
 from supabase import create_client, Client
 import json
 import logging
 
+# Use the libuv event loop when available - Playwright traffic is thousands
+# of small awaits per run and uvloop services them with much less overhead
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Recycle the browser context after this many runs to bound the slow memory
+# growth long-lived Playwright contexts accumulate
+CONTEXT_RECYCLE_RUNS = 25
+
+# How long fetched API hits stay fresh - back-to-back runs (retries, manual
+# replays) inside this window reuse the previous result
+HITS_CACHE_TTL_SECONDS = 300
+
+# Where per-date content hashes of successful runs are kept so reruns over
+# unchanged data can skip processing and the Supabase upsert
+SCRAPE_CACHE_DIR = '.scrape_cache'
+
+# Analytics/telemetry endpoints that contribute nothing to the scrape -
+# Kibana phones home to its own telemetry service too
+BLOCKED_TELEMETRY_HOSTS = (
+    'google-analytics.com',
+    'segment.io',
+    'sentry.io',
+    'telemetry.elastic.co'
+)
+
 class KibanaWebScraper:
+    # Selector groups used on the login/discover hot paths - class-level so
+    # they are built once instead of being reallocated on every call
+    SUCCESS_INDICATOR_CSS = '[data-test-subj="kibanaChrome"], .euiHeader, nav[aria-label="Primary"], .kbnAppWrapper'
+    ERROR_INDICATOR_CSS = '.error, .alert-danger, .euiCallOut--danger'
+    DISCOVER_TABLE_SELECTORS = (
+        '[data-test-subj="discoverDocTable"]',
+        '.euiDataGrid',
+        '.kuiTable',
+        'table'
+    )
+    EXTRACT_TABLE_SELECTORS = (
+        'table',
+        '[data-test-subj="discoverDocTable"] table',
+        '.euiDataGrid',
+        '.kuiTable table',
+        '.discover-table table'
+    )
+    # Table columns process_appointment_data actually reads - anything else
+    # is filtered out inside the browser before crossing CDP
+    WANTED_HEADERS = (
+        'Time',
+        'bookingId',
+        'startDateTime',
+        'location.businessName',
+        'location.businessId',
+        'client.firstName',
+        'client.lastName',
+        'client.email',
+        'isGoogleBooking',
+        'offering.name',
+        'bookingStatus.label'
+    )
+
     def __init__(self):
         """Initialize with environment variables"""
         self.kibana_base_url = os.environ.get('KIBANA_BASE_URL')
@@ -30,221 +98,506 @@ class KibanaWebScraper:
         
         # Initialize Supabase client
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
-    
+
+        # Pre-build the 15-day rolling window discover URL once - the
+        # URL-encoded query string is constant for a given base URL
+        self.discover_url = f"{self.kibana_base_url}/app/discover#/view/84b881a0-6b52-11f0-89e0-f9470fca93e5?_g=(filters%3A!()%2CrefreshInterval%3A(pause%3A!t%2Cvalue%3A0)%2Ctime%3A(from%3Anow-15d%2Cto%3Anow))"
+
+        # Index pattern behind the Discover data view, used by the direct
+        # _search API fast path
+        self.kibana_index_pattern = os.environ.get('KIBANA_INDEX_PATTERN', 'appointments-*')
+
+        # Debug captures are opt-in: each screenshot costs a browser paint +
+        # PNG encode + disk write, and the HTML dumps serialize the full DOM
+        self.debug = os.environ.get('SCRAPER_DEBUG') == '1'
+
+        # Long-lived browser state, populated by start()
+        self._playwright = None
+        self._context = None
+        self._cdp_browser = None
+        self._runs_since_recycle = 0
+        # Concurrent runs in run_many share the context - the recycle must
+        # not close it while sibling scrapes still hold pages on it
+        self._active_pages = 0
+        self._recycle_lock = asyncio.Lock()
+
+        # Optional long-running Chrome sidecar (chrome --headless
+        # --remote-debugging-port=9222); attaching over CDP skips the
+        # per-process launch entirely
+        self.cdp_url = os.environ.get('CDP_URL')
+
+        # API result cache keyed by time window, disabled via SCRAPER_NO_CACHE=1
+        self._hits_cache = {}
+
+        # Persistent Chromium profile - keeps the HTTP cache (Kibana's
+        # multi-MB JS bundles) on disk between runs
+        self.user_data_dir = os.environ.get('SCRAPER_USER_DATA_DIR', '.chromium-cache')
+
+    async def start(self):
+        """Launch Chromium once for the life of the service - per-run launches
+        cost 1-3s of cold start each on a frequent scrape cadence"""
+        if self._context:
+            return
+
+        # Imported here rather than at module top: the API fast path never
+        # touches Playwright, so one-shot runs that stay on it skip the
+        # import cost entirely
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        if self.cdp_url:
+            logger.info(f"Attaching to browser sidecar at {self.cdp_url}")
+            self._cdp_browser = await self._playwright.chromium.connect_over_cdp(self.cdp_url)
+            # Reuse the sidecar's default context so its cookies and cache
+            # carry across invocations
+            if self._cdp_browser.contexts:
+                self._context = self._cdp_browser.contexts[0]
+            else:
+                self._context = await self._cdp_browser.new_context(user_agent=USER_AGENT)
+        else:
+            self._context = await self._launch_persistent_context()
+        await self._block_heavy_assets()
+
+    async def _launch_persistent_context(self):
+        """A persistent profile lets Chromium serve Kibana's bundles from its
+        disk cache on every run after the first, instead of re-downloading
+        and re-parsing them each time"""
+        return await self._playwright.chromium.launch_persistent_context(
+            self.user_data_dir,
+            headless=True,
+            args=[
+                '--disable-blink-features=AutomationControlled',
+                '--disable-web-security',
+                '--disable-features=VizDisplayCompositor'
+            ],
+            user_agent=USER_AGENT
+        )
+
+    async def _block_heavy_assets(self):
+        """Abort image/font/media/stylesheet requests - none of them affect
+        the data we scrape and they dominate Kibana's page weight. Route
+        handlers can leak on very long-lived contexts, but the periodic
+        context recycle keeps that bounded."""
+        async def handle_route(route):
+            if route.request.resource_type in {'image', 'font', 'media', 'stylesheet'}:
+                await route.abort()
+            elif any(host in route.request.url for host in BLOCKED_TELEMETRY_HOSTS):
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await self._context.route('**/*', handle_route)
+
+    async def stop(self):
+        """Close the long-lived browser state"""
+        if self._cdp_browser:
+            # Disconnect from the sidecar without terminating it - the
+            # whole point is that it outlives this process
+            await self._cdp_browser.close()
+            self._cdp_browser = None
+            self._context = None
+        elif self._context:
+            # Closing a persistent context also shuts down its browser
+            await self._context.close()
+            self._context = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _recycle_context_if_needed(self):
+        """Relaunch the context every CONTEXT_RECYCLE_RUNS runs to bound
+        memory growth - cookies and HTTP cache live in the profile dir, so
+        nothing is lost across the restart"""
+        # A sidecar browser's lifecycle is not ours to manage
+        if self._cdp_browser:
+            return
+
+        self._runs_since_recycle += 1
+        if self._runs_since_recycle < CONTEXT_RECYCLE_RUNS:
+            return
+
+        # Only one finishing run may recycle, and only while no sibling run
+        # still holds a page on the context - otherwise defer; the counter
+        # stays over threshold so the next idle finisher picks it up
+        async with self._recycle_lock:
+            if self._runs_since_recycle < CONTEXT_RECYCLE_RUNS:
+                return
+            if self._active_pages:
+                logger.info(f"Deferring context recycle - {self._active_pages} scrape(s) in flight")
+                return
+
+            logger.info("Recycling browser context")
+            await self._context.close()
+            self._context = await self._launch_persistent_context()
+            await self._block_heavy_assets()
+            self._runs_since_recycle = 0
+
+    async def _snap(self, page, name):
+        """Take a debug screenshot only when SCRAPER_DEBUG=1"""
+        if self.debug:
+            await page.screenshot(path=name)
+
+    async def _dump(self, name, content):
+        """Write a failure-path DOM dump off the event loop, capped at 2MB -
+        page.content() can be many MB and a sync write would block the loop"""
+        def write():
+            with open(name, 'w') as f:
+                f.write(content[:2_000_000])
+        await asyncio.to_thread(write)
+
+    async def _with_retry(self, coro_factory, attempts=3, base=1.5):
+        """Retry a transient browser step with exponential backoff plus
+        jitter - one flaky navigation should not fail the whole daily run"""
+        for attempt in range(1, attempts + 1):
+            try:
+                return await coro_factory()
+            except Exception as e:
+                if attempt == attempts:
+                    raise
+                delay = base ** attempt + random.random()
+                logger.warning(f"Attempt {attempt} failed ({e}) - retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def _raw_hash(self, raw_appointments):
+        """Content hash of the raw extraction - identical raw data means the
+        previous run's processing and upsert already covered it"""
+        payload = json.dumps(raw_appointments, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _check_scrape_cache(self, target_date, raw_hash):
+        """Return the cached records_processed count when this date's raw
+        data is unchanged since the last successful run, else None"""
+        path = os.path.join(SCRAPE_CACHE_DIR, f"{target_date.date().isoformat()}.json")
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            if entry.get('hash') == raw_hash:
+                return entry.get('records_processed')
+        except Exception:
+            pass
+        return None
+
+    def _store_scrape_cache(self, target_date, raw_hash, records_processed):
+        """Record a successful run so identical reruns can skip the
+        process/upload steps"""
+        try:
+            os.makedirs(SCRAPE_CACHE_DIR, exist_ok=True)
+            path = os.path.join(SCRAPE_CACHE_DIR, f"{target_date.date().isoformat()}.json")
+            with open(path, 'w') as f:
+                json.dump({'hash': raw_hash, 'records_processed': records_processed, 'ts': time.time()}, f)
+        except Exception as e:
+            logger.warning(f"Failed to write scrape cache: {e}")
+
+    async def _get_session_cookie(self):
+        """Get a Kibana session cookie without a browser - from the env if the
+        caller already has one, otherwise via the internal login endpoint"""
+        session_cookie = os.environ.get('KIBANA_SESSION_COOKIE')
+        if session_cookie:
+            return session_cookie
+
+        async with httpx.AsyncClient(timeout=15.0) as client:
+            response = await client.post(
+                f"{self.kibana_base_url}/internal/security/login",
+                headers={'kbn-xsrf': 'true', 'Content-Type': 'application/json'},
+                json={
+                    'providerType': 'basic',
+                    'providerName': 'basic',
+                    'currentURL': self.kibana_base_url,
+                    'params': {
+                        'username': self.kibana_username,
+                        'password': self.kibana_password
+                    }
+                }
+            )
+        response.raise_for_status()
+        return response.cookies.get('sid')
+
+    async def stream_all_hits(self, client):
+        """Page through every hit with a point-in-time + search_after cursor.
+        A single _search call is capped by its size parameter and the Discover
+        grid virtualizes long result sets, so this is the only way to get the
+        complete window in bulk JSON pages."""
+        pit_response = await client.post(
+            '/api/console/proxy',
+            params={'path': f'/{self.kibana_index_pattern}/_pit?keep_alive=1m', 'method': 'POST'}
+        )
+        pit_response.raise_for_status()
+        pit_id = pit_response.json()['id']
+
+        hits = []
+        search_after = None
+
+        try:
+            while True:
+                body = {
+                    'size': 1000,
+                    'pit': {'id': pit_id, 'keep_alive': '1m'},
+                    'sort': [{'startDateTime': 'asc'}],
+                    'query': {
+                        'bool': {
+                            'filter': [
+                                {'range': {'startDateTime': {'gte': 'now-15d', 'lte': 'now'}}}
+                            ]
+                        }
+                    }
+                }
+                if search_after is not None:
+                    body['search_after'] = search_after
+
+                response = await client.post(
+                    '/api/console/proxy',
+                    params={'path': '/_search', 'method': 'POST'},
+                    json=body
+                )
+                response.raise_for_status()
+                payload = response.json()
+
+                batch = payload['hits']['hits']
+                if not batch:
+                    break
+
+                hits.extend(batch)
+                search_after = batch[-1]['sort']
+                pit_id = payload.get('pit_id', pit_id)
+
+                if len(batch) < 1000:
+                    break
+        finally:
+            # Close the PIT so Elasticsearch can release its search context
+            try:
+                await client.post(
+                    '/api/console/proxy',
+                    params={'path': '/_pit', 'method': 'DELETE'},
+                    json={'id': pit_id}
+                )
+            except Exception:
+                pass
+
+        return hits
+
+    async def fetch_appointments_via_api(self):
+        """Fast path: pull the 15-day appointment hits straight from Kibana's
+        internal _search endpoint instead of rendering the Discover UI.
+        Returns raw appointment dicts shaped like the DOM extraction output,
+        or None when the API path fails and the browser fallback should run."""
+        logger.info("=== Fetching appointments via Kibana _search API ===")
+
+        # The window is identical across runs, so retries and manual replays
+        # within the TTL can skip the fetch entirely
+        window = ('now-15d', 'now')
+        cache_enabled = os.environ.get('SCRAPER_NO_CACHE') != '1'
+        cached = self._hits_cache.get(window)
+        if cache_enabled and cached and time.time() - cached[0] < HITS_CACHE_TTL_SECONDS:
+            logger.info(f"Reusing {len(cached[1])} cached API appointments")
+            return cached[1]
+
+        try:
+            session_cookie = await self._get_session_cookie()
+            if not session_cookie:
+                logger.warning("No Kibana session cookie available")
+                return None
+
+            async with httpx.AsyncClient(
+                base_url=self.kibana_base_url,
+                cookies={'sid': session_cookie},
+                headers={'kbn-xsrf': 'true', 'Content-Type': 'application/json'},
+                timeout=45.0
+            ) as client:
+                try:
+                    # Preferred: PIT + search_after pagination, no size cap
+                    hits = await self.stream_all_hits(client)
+                except Exception as e:
+                    logger.warning(f"PIT pagination failed ({e}) - using single _search call")
+                    # Same query the Discover view issues: the saved search's
+                    # index pattern over the 15-day rolling window
+                    search_body = {
+                        'params': {
+                            'index': self.kibana_index_pattern,
+                            'body': {
+                                'size': 1000,
+                                'sort': [{'startDateTime': 'asc'}],
+                                'query': {
+                                    'bool': {
+                                        'filter': [
+                                            {'range': {'startDateTime': {'gte': 'now-15d', 'lte': 'now'}}}
+                                        ]
+                                    }
+                                }
+                            }
+                        }
+                    }
+                    response = await client.post('/internal/search/es', json=search_body)
+                    response.raise_for_status()
+                    hits = response.json()['rawResponse']['hits']['hits']
+
+            if not hits:
+                logger.warning("API search returned no hits")
+                return []
+
+            # Flatten nested objects to the 'location.businessName'-style
+            # dotted columns the processing step already expects
+            df = pd.json_normalize([hit['_source'] for hit in hits], sep='.')
+            if 'Time' not in df.columns and 'startDateTime' in df.columns:
+                # The Discover grid synthesizes its Time column from startDateTime
+                df['Time'] = df['startDateTime']
+
+            records = df.to_dict('records')
+            logger.info(f"Fetched {len(records)} appointments via API")
+            if cache_enabled:
+                self._hits_cache[window] = (time.time(), records)
+            return records
+
+        except Exception as e:
+            logger.warning(f"API fetch failed ({e}) - falling back to browser scrape")
+            return None
+
     async def login_to_kibana(self, page):
         """Login to Kibana using username/password"""
         logger.info("=== Starting Kibana Login ===")
         
         # Step 1: Navigate to base URL
         logger.info(f"Step 1: Navigating to {self.kibana_base_url}")
-        await page.goto(self.kibana_base_url, timeout=30000)
-        await page.wait_for_load_state('networkidle', timeout=15000)
-        await page.screenshot(path='login_step1_initial.png')
+        # domcontentloaded, not networkidle: Kibana keeps long-poll
+        # connections open so networkidle burns its whole timeout
+        await page.goto(self.kibana_base_url, wait_until='domcontentloaded', timeout=30000)
+        await self._snap(page, 'login_step1_initial.png')
         
         current_url = page.url
         page_title = await page.title()
         logger.info(f"After navigation - URL: {current_url}, Title: {page_title}")
-        
+
+        # One wait that resolves on whichever lands first: the Kibana chrome
+        # (session still valid) or a login field (full flow needed). A
+        # cold profile no longer burns a fixed probe timeout before the form
+        try:
+            await page.wait_for_selector(
+                self.SUCCESS_INDICATOR_CSS + ', input[name="username"], input[type="email"], input[type="password"]',
+                state='attached',
+                timeout=15000
+            )
+        except Exception:
+            pass
+        if await page.locator(self.SUCCESS_INDICATOR_CSS).count():
+            logger.info("Already authenticated, skipping login")
+            return True
+
         # Step 2: Look for and click "Log in with Elasticsearch"
+        # or_() unions let Playwright's poller check every candidate on each
+        # tick instead of burning a 3s timeout per selector
         logger.info("Step 2: Looking for Elasticsearch login option")
-        elasticsearch_selectors = [
-            'text="Log in with Elasticsearch"',
-            ':has-text("Log in with Elasticsearch")',
-            'button:has-text("Elasticsearch")',
-            '[data-test-subj="loginCard-elasticsearch"]'
-        ]
-        
-        elasticsearch_button = None
-        for selector in elasticsearch_selectors:
-            try:
-                logger.info(f"Trying selector: {selector}")
-                elasticsearch_button = await page.wait_for_selector(selector, timeout=3000)
-                if elasticsearch_button:
-                    logger.info(f"Found Elasticsearch button with: {selector}")
-                    break
-            except:
-                logger.info(f"Selector {selector} not found")
-                continue
-        
-        if elasticsearch_button:
+        elasticsearch_button = page.locator('text="Log in with Elasticsearch"').or_(
+            page.locator('[data-test-subj="loginCard-elasticsearch"]')).or_(
+            page.locator('button:has-text("Elasticsearch")')).first
+
+        try:
+            await elasticsearch_button.wait_for(state='attached', timeout=10000)
             logger.info("Clicking Elasticsearch login button")
             await elasticsearch_button.click()
-            await page.wait_for_load_state('networkidle', timeout=10000)
-            await page.screenshot(path='login_step2_elasticsearch_click.png')
-            
+            # The username-field probe below is the real readiness signal
+            await self._snap(page, 'login_step2_elasticsearch_click.png')
+
             current_url = page.url
             page_title = await page.title()
             logger.info(f"After Elasticsearch click - URL: {current_url}, Title: {page_title}")
-        else:
+        except Exception:
             logger.warning("No Elasticsearch login button found - proceeding to username/password")
-        
+
         # Step 3: Find and fill username
         logger.info("Step 3: Looking for username field")
-        username_selectors = [
-            'input[name="username"]',
-            'input[type="email"]',
-            'input[type="text"]',
-            'input[placeholder*="username"]',
-            'input[placeholder*="email"]',
-            '#username',
-            '#email'
-        ]
-        
-        username_field = None
-        for selector in username_selectors:
-            try:
-                logger.info(f"Trying username selector: {selector}")
-                username_field = await page.wait_for_selector(selector, timeout=3000)
-                if username_field:
-                    logger.info(f"Found username field with: {selector}")
-                    break
-            except:
-                logger.info(f"Username selector {selector} not found")
-                continue
-        
-        if not username_field:
+        username_field = page.locator('input[name="username"]').or_(
+            page.locator('input[type="email"]')).or_(
+            page.locator('input[type="text"]')).or_(
+            page.locator('input[placeholder*="username"]')).or_(
+            page.locator('input[placeholder*="email"]')).or_(
+            page.locator('#username')).or_(
+            page.locator('#email')).first
+
+        # fill() auto-waits for the field, so no separate wait_for round-trip
+        try:
+            await username_field.fill(self.kibana_username, timeout=10000)
+        except Exception:
             await page.screenshot(path='login_step3_no_username.png')
-            content = await page.content()
-            with open('login_step3_page_content.html', 'w') as f:
-                f.write(content)
+            await self._dump('login_step3_page_content.html', await page.content())
             raise Exception("Could not find username field")
-        
-        # Fill username using Playwright's fill() method
-        await username_field.fill(self.kibana_username)
         logger.info(f"Filled username: {self.kibana_username}")
-        await page.screenshot(path='login_step3_username_filled.png')
-        
+        await self._snap(page, 'login_step3_username_filled.png')
+
         # Step 4: Find and fill password
         logger.info("Step 4: Looking for password field")
-        password_selectors = [
-            'input[type="password"]',
-            'input[name="password"]',
-            '#password'
-        ]
-        
-        password_field = None
-        for selector in password_selectors:
-            try:
-                logger.info(f"Trying password selector: {selector}")
-                password_field = await page.wait_for_selector(selector, timeout=3000)
-                if password_field:
-                    logger.info(f"Found password field with: {selector}")
-                    break
-            except:
-                logger.info(f"Password selector {selector} not found")
-                continue
-        
-        if not password_field:
+        password_field = page.locator('input[type="password"]').or_(
+            page.locator('input[name="password"]')).or_(
+            page.locator('#password')).first
+
+        try:
+            await password_field.fill(self.kibana_password, timeout=10000)
+        except Exception:
             await page.screenshot(path='login_step4_no_password.png')
             raise Exception("Could not find password field")
-        
-        # Fill password using Playwright's fill() method
-        await password_field.fill(self.kibana_password)
         logger.info("Filled password")
-        await page.screenshot(path='login_step4_password_filled.png')
-        
+        await self._snap(page, 'login_step4_password_filled.png')
+
         # Step 5: Submit the form
         logger.info("Step 5: Submitting login form")
-        submit_selectors = [
-            'button[type="submit"]',
-            'input[type="submit"]',
-            'button:has-text("Log in")',
-            'button:has-text("Sign in")',
-            'button:has-text("Login")',
-            'form button'
-        ]
-        
-        submit_button = None
-        for selector in submit_selectors:
-            try:
-                logger.info(f"Trying submit selector: {selector}")
-                submit_button = await page.wait_for_selector(selector, timeout=3000)
-                if submit_button:
-                    logger.info(f"Found submit button with: {selector}")
-                    break
-            except:
-                logger.info(f"Submit selector {selector} not found")
-                continue
-        
-        if submit_button:
-            await submit_button.click()
+        submit_button = page.locator('button[type="submit"]').or_(
+            page.locator('input[type="submit"]')).or_(
+            page.locator('button:has-text("Log in")')).or_(
+            page.locator('button:has-text("Sign in")')).or_(
+            page.locator('button:has-text("Login")')).or_(
+            page.locator('form button')).first
+
+        try:
+            await submit_button.click(timeout=10000)
             logger.info("Clicked submit button")
-        else:
+        except Exception:
             logger.info("No submit button found, trying Enter key")
             await password_field.press('Enter')
-        
-        await page.screenshot(path='login_step5_after_submit.png')
+
+        await self._snap(page, 'login_step5_after_submit.png')
         
         # Step 6: Wait and verify login success
         logger.info("Step 6: Verifying login success")
-        await page.wait_for_timeout(5000)  # Wait 5 seconds for redirect
-        
-        # Check for login success over multiple attempts
-        for i in range(3):
-            await page.wait_for_timeout(3000)
-            await page.screenshot(path=f'login_step6_check_{i+1}.png')
-            
-            current_url = page.url
-            page_title = await page.title()
-            logger.info(f"Login check {i+1} - URL: {current_url}, Title: {page_title}")
-            
-            # Look for Kibana success indicators
-            success_indicators = [
-                '[data-test-subj="kibanaChrome"]',
-                '.euiHeader',
-                'nav[aria-label="Primary"]',
-                '.kbnAppWrapper'
-            ]
-            
-            for indicator in success_indicators:
-                try:
-                    element = await page.wait_for_selector(indicator, timeout=2000)
-                    if element:
-                        logger.info(f"LOGIN SUCCESS: Found Kibana UI element: {indicator}")
-                        await page.screenshot(path='login_success_final.png')
-                        return True
-                except:
-                    continue
-            
-            # Check for error messages
-            error_selectors = [
-                '.error',
-                '.alert-danger',
-                '.euiCallOut--danger',
-                ':has-text("Invalid")',
-                ':has-text("incorrect")',
-                ':has-text("failed")'
-            ]
-            
-            for error_selector in error_selectors:
-                try:
-                    error_element = await page.wait_for_selector(error_selector, timeout=1000)
-                    if error_element:
-                        error_text = await error_element.inner_text()
-                        logger.error(f"Login error found: {error_text}")
-                        await page.screenshot(path='login_error_found.png')
-                        raise Exception(f"Login failed: {error_text}")
-                except:
-                    continue
-            
-            # Check if still on login page
-            if "login" in current_url.lower() or "auth" in current_url.lower():
-                logger.warning(f"Still on login page: {current_url}")
-            else:
-                logger.info(f"Redirected to: {current_url}")
-                # If we're not on login page anymore, assume success
-                logger.info("Login appears successful - not on login page")
-                await page.screenshot(path='login_success_by_redirect.png')
-                return True
-        
+
+        # A single comma-list selector is matched in parallel by the browser,
+        # so one budget covers every success candidate
+        success_loc = page.locator(self.SUCCESS_INDICATOR_CSS).first
+        # One union over all error signals; get_by_text replaces the old
+        # bare :has-text() pseudo-selectors
+        error_loc = page.locator(self.ERROR_INDICATOR_CSS).or_(
+            page.get_by_text('Invalid')).or_(
+            page.get_by_text('incorrect')).or_(
+            page.get_by_text('failed')).first
+
+        # Race the success and error indicators instead of sleeping in a
+        # fixed 5s + 3x3s polling loop - Playwright re-evaluates locators on
+        # every page mutation, so this returns as soon as the redirect lands
+        success_task = asyncio.create_task(success_loc.wait_for(state='visible', timeout=15000))
+        error_task = asyncio.create_task(error_loc.wait_for(state='visible', timeout=15000))
+
+        done, pending = await asyncio.wait([success_task, error_task], return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+
+        success_found = success_task in done and success_task.exception() is None
+        error_found = error_task in done and error_task.exception() is None
+
+        if success_found:
+            logger.info("LOGIN SUCCESS: Found Kibana UI element")
+            await self._snap(page, 'login_success_final.png')
+            return True
+
+        if error_found:
+            error_text = await error_loc.inner_text()
+            logger.error(f"Login error found: {error_text}")
+            await page.screenshot(path='login_error_found.png')
+            raise Exception(f"Login failed: {error_text}")
+
+
         # Final check
         current_url = page.url
         if "login" in current_url.lower() or "auth" in current_url.lower():
             logger.error("Login failed - still on login page after multiple attempts")
             await page.screenshot(path='login_failed_final.png')
-            content = await page.content()
-            with open('login_failed_content.html', 'w') as f:
-                f.write(content)
+            await self._dump('login_failed_content.html', await page.content())
             raise Exception(f"Login failed - still on login page: {current_url}")
         else:
             logger.info("Login completed - assuming success")
@@ -253,16 +606,16 @@ class KibanaWebScraper:
     async def navigate_to_discover(self, page, target_date=None):
         """Navigate to the discover page with 15-day appointment data"""
         # Use the 15-day rolling window URL which is more reliable
-        discover_url = f"{self.kibana_base_url}/app/discover#/view/84b881a0-6b52-11f0-89e0-f9470fca93e5?_g=(filters%3A!()%2CrefreshInterval%3A(pause%3A!t%2Cvalue%3A0)%2Ctime%3A(from%3Anow-15d%2Cto%3Anow))"
-        
+        discover_url = self.discover_url
+
         logger.info(f"Navigating to 15-day appointment data view...")
         logger.info(f"Target URL: {discover_url}")
         
         try:
-            await page.goto(discover_url, timeout=45000)
-            
-            # Wait for the page to load completely
-            await page.wait_for_load_state('networkidle', timeout=30000)
+            await page.goto(discover_url, wait_until='domcontentloaded', timeout=45000)
+
+            # No networkidle wait - the data table selector below is the
+            # signal that the page actually finished rendering
             
             # Check if we got redirected back to login
             current_url = page.url
@@ -275,33 +628,28 @@ class KibanaWebScraper:
             logger.info("Discover page loaded")
             
             # Take screenshot after navigation
-            await page.screenshot(path='discover_loaded.png')
-            
-            # Wait for data table to appear
-            table_selectors = [
-                '[data-test-subj="discoverDocTable"]',
-                '.euiDataGrid',
-                '.kuiTable',
-                'table'
-            ]
+            await self._snap(page, 'discover_loaded.png')
             
+            # Wait for data table to appear - one comma-list wait covers
+            # every candidate selector in a single 15s budget instead of
+            # 15s per selector
             table_found = False
-            for selector in table_selectors:
-                try:
-                    await page.wait_for_selector(selector, timeout=15000)
-                    logger.info(f"Found data table with selector: {selector}")
-                    table_found = True
-                    break
-                except:
-                    continue
+            try:
+                # 'attached' skips the extra visibility re-check - the row
+                # wait below is what actually gates on rendered data
+                await page.wait_for_selector(
+                    ', '.join(self.DISCOVER_TABLE_SELECTORS), state='attached', timeout=15000
+                )
+                logger.info("Found data table")
+                table_found = True
+            except:
+                pass
             
             if not table_found:
                 await page.screenshot(path='no_table_found.png')
                 
                 # Save page content for debugging
-                content = await page.content()
-                with open('discover_page_debug.html', 'w') as f:
-                    f.write(content)
+                await self._dump('discover_page_debug.html', await page.content())
                 
                 # Get page title and any error messages
                 page_title = await page.title()
@@ -321,12 +669,20 @@ class KibanaWebScraper:
                 
                 raise Exception(f"No data table found on discover page. URL: {current_url}, Title: {page_title}")
             
-            # Wait a bit more for data to populate
+            # Wait until rows actually render (or Kibana says there are
+            # none) instead of sleeping a fixed 8 seconds
             logger.info("Waiting for data to populate...")
-            await page.wait_for_timeout(8000)
+            try:
+                await page.wait_for_function(
+                    """() => document.querySelector('[data-test-subj="discoverNoResults"]')
+                        || document.querySelectorAll('table tbody tr').length > 0""",
+                    timeout=15000
+                )
+            except:
+                logger.warning("No data rows or no-results indicator within 15s - continuing")
             
             # Final screenshot
-            await page.screenshot(path='discover_ready.png')
+            await self._snap(page, 'discover_ready.png')
             logger.info("Discover page ready for data extraction")
             
         except Exception as e:
@@ -334,9 +690,7 @@ class KibanaWebScraper:
             await page.screenshot(path='discover_navigation_error.png')
             
             try:
-                content = await page.content()
-                with open('discover_navigation_error.html', 'w') as f:
-                    f.write(content)
+                await self._dump('discover_navigation_error.html', await page.content())
                     
                 current_url = page.url
                 page_title = await page.title()
@@ -351,7 +705,7 @@ class KibanaWebScraper:
         logger.info("Extracting appointment data from page...")
         
         # Always take a screenshot before extraction for debugging
-        await page.screenshot(path='before_extraction.png')
+        await self._snap(page, 'before_extraction.png')
         
         # Log current URL and page title
         current_url = page.url
@@ -362,114 +716,89 @@ class KibanaWebScraper:
         appointments = []
         
         try:
-            # Look for tables using multiple selectors
-            table_selectors = [
-                'table',
-                '[data-test-subj="discoverDocTable"] table',
-                '.euiDataGrid',
-                '.kuiTable table',
-                '.discover-table table'
-            ]
-            
-            table_element = None
-            for selector in table_selectors:
+            # Wait for any of the known table containers to exist - attached,
+            # not visible, since the evaluate below only needs the DOM nodes
+            # and a virtualized/hidden table would waste the whole budget
+            try:
+                await page.wait_for_selector(
+                    ', '.join(self.EXTRACT_TABLE_SELECTORS), state='attached', timeout=5000
+                )
+            except:
+                pass
+
+            # Walk the whole table inside the browser and bring the cell text
+            # back as one JSON blob - one round-trip instead of an IPC call
+            # per cell (~10 per row)
+            table_data = await page.evaluate('''(keep) => {
+                const table = document.querySelector('[data-test-subj="discoverDocTable"] table')
+                    || document.querySelector('.kuiTable table')
+                    || document.querySelector('.discover-table table')
+                    || document.querySelector('table');
+                if (!table) return null;
+                const rows = Array.from(table.rows).map(
+                    row => Array.from(row.cells).map(cell => cell.innerText.trim()));
+                const headers = rows[0] || [];
+                const keepSet = new Set(keep);
+                const idx = headers.map((h, i) => keepSet.has(h) ? i : -1).filter(i => i >= 0);
+                // Only filter when every wanted column matched - a partial
+                // match means the header text differs from what we expect,
+                // and dropping the misses (e.g. bookingId) would silently
+                // empty the scrape downstream
+                if (idx.length !== keep.length) return {headers: headers, rows: rows.slice(1)};
+                return {
+                    headers: idx.map(i => headers[i]),
+                    rows: rows.slice(1).map(r => idx.map(i => r[i] !== undefined ? r[i] : ''))
+                };
+            }''', list(self.WANTED_HEADERS))
+
+            if table_data is None:
+                await page.screenshot(path='no_table_elements.png')
+
+                # Save page content for debugging
+                await self._dump('extraction_page_debug.html', await page.content())
+
+                # Get all text content for debugging
                 try:
-                    table_element = await page.wait_for_selector(selector, timeout=5000)
-                    if table_element:
-                        logger.info(f"Found table with selector: {selector}")
-                        break
-                except:
-                    continue
-            
-            if not table_element:
-                # Try to get any table on the page
-                tables = await page.query_selector_all('table')
-                if tables:
-                    table_element = tables[0]
-                    logger.info("Using first table found on page")
-                else:
-                    await page.screenshot(path='no_table_elements.png')
-                    
-                    # Save page content for debugging
-                    content = await page.content()
-                    with open('extraction_page_debug.html', 'w') as f:
-                        f.write(content)
-                    
-                    # Get all text content for debugging
-                    try:
-                        page_text = await page.evaluate('''() => {
-                            return document.body.innerText;
-                        }''')
-                        
-                        with open('page_text_content.txt', 'w') as f:
-                            f.write(page_text)
-                        
-                        logger.info("Saved page text content for debugging")
-                    except Exception as e2:
-                        logger.error(f"Failed to extract page text: {e2}")
-                    
-                    raise Exception(f"No table elements found on page: {current_url}")
-            
-            # Extract all rows from the table
-            rows = await table_element.query_selector_all('tr')
-            logger.info(f"Found {len(rows)} table rows")
-            
-            if len(rows) < 2:  # Need at least header + 1 data row
+                    page_text = await page.evaluate('''() => {
+                        return document.body.innerText;
+                    }''')
+
+                    await self._dump('page_text_content.txt', page_text)
+
+                    logger.info("Saved page text content for debugging")
+                except Exception as e2:
+                    logger.error(f"Failed to extract page text: {e2}")
+
+                raise Exception(f"No table elements found on page: {current_url}")
+
+            headers = table_data['headers']
+            rows = table_data['rows']
+            logger.info(f"Found {len(rows) + 1} table rows")
+
+            if not rows:
                 await page.screenshot(path='empty_table.png')
                 logger.warning("Table found but no data rows")
                 return []
-            
-            # Extract headers from first row
-            header_row = rows[0]
-            header_cells = await header_row.query_selector_all('th, td')
-            headers = []
-            
-            for cell in header_cells:
-                text = await cell.inner_text()
-                headers.append(text.strip())
-            
+
             logger.info(f"Table headers: {headers}")
-            
-            # Extract data rows (skip header row)
-            for i, row in enumerate(rows[1:], 1):
-                try:
-                    cells = await row.query_selector_all('td, th')
-                    if len(cells) == 0:
-                        continue
-                    
-                    row_data = []
-                    for cell in cells:
-                        text = await cell.inner_text()
-                        row_data.append(text.strip())
-                    
-                    # Only process rows that have the expected number of columns
-                    if len(row_data) >= len(headers):
-                        appointment = {}
-                        for j, header in enumerate(headers):
-                            if j < len(row_data):
-                                appointment[header] = row_data[j]
-                        
-                        # Skip empty or invalid rows
-                        if appointment.get('bookingId') and appointment.get('bookingId') != '-':
-                            appointments.append(appointment)
-                            
-                        # Process more rows but with a reasonable limit to prevent infinite loops
-                        if i >= 500:
-                            logger.info("Processed 500 rows, stopping to prevent timeout")
-                            break
-                            
-                except Exception as e:
-                    logger.warning(f"Error processing row {i}: {e}")
-                    continue
-            
+
+            # Build the appointment dicts in one comprehension - the slice
+            # keeps the old 500-row safety cap without a per-iteration check
+            candidates = (dict(zip(headers, row_data)) for row_data in rows[:500]
+                          if row_data and len(row_data) >= len(headers))
+            appointments = [a for a in candidates if a.get('bookingId') and a.get('bookingId') != '-']
+            if len(rows) > 500:
+                logger.info("Processed 500 rows, stopping to prevent timeout")
+
             logger.info(f"Successfully extracted {len(appointments)} appointments")
             
             # Take a screenshot showing the extracted data
-            await page.screenshot(path='data_extracted.png')
+            await self._snap(page, 'data_extracted.png')
             
             # Save extracted data for debugging
-            with open('extracted_data.json', 'w') as f:
-                json.dump(appointments, f, indent=2)
+            if self.debug:
+                with open('extracted_data.json', 'w') as f:
+                    json.dump(appointments, f, indent=2)
             
             return appointments
             
@@ -479,9 +808,7 @@ class KibanaWebScraper:
             
             # Always save debugging info on errors
             try:
-                content = await page.content()
-                with open('extraction_error_page.html', 'w') as f:
-                    f.write(content)
+                await self._dump('extraction_error_page.html', await page.content())
             except:
                 pass
             
@@ -500,185 +827,103 @@ class KibanaWebScraper:
         if df.empty:
             return df
         
-        # Debug: Let's see exactly what we extracted
-        logger.info("=== DEBUGGING EXTRACTED DATA ===")
-        logger.info(f"DataFrame shape: {df.shape}")
-        logger.info(f"DataFrame columns: {list(df.columns)}")
-        
-        # Check if startDateTime column exists and what it contains
-        if 'startDateTime' in df.columns:
-            logger.info("startDateTime column found!")
-            logger.info(f"startDateTime data type: {df['startDateTime'].dtype}")
-            logger.info(f"startDateTime sample values:")
-            for i in range(min(5, len(df))):
-                val = df['startDateTime'].iloc[i]
-                logger.info(f"  Row {i}: '{val}' (type: {type(val)})")
-        else:
-            logger.error("startDateTime column NOT found!")
-            logger.info("Available columns:")
-            for col in df.columns:
-                logger.info(f"  - '{col}'")
-        
-        # Simple column mapping using exact Kibana column names
-        logger.info("=== MAPPING COLUMNS ===")
-        df['booking_id'] = df['bookingId']
-        df['time_column'] = df['Time'] 
-        df['location_business_name'] = df['location.businessName']
-        df['location_business_id'] = df['location.businessId']
-        df['client_last_name'] = df['client.lastName']
-        df['is_google_booking'] = df['isGoogleBooking']
-        df['offering_name'] = df['offering.name']
-        df['client_first_name'] = df['client.firstName']
-        df['client_email'] = df['client.email']
-        df['booking_status_label'] = df['bookingStatus.label']
-        df['start_date_time'] = df['startDateTime']
-        
-        # Create customer name
-        df['customer_name'] = (df['client_first_name'].fillna('') + ' ' + df['client_last_name'].fillna('')).str.strip()
-        
-        # Debug the mapped start_date_time column
-        logger.info("=== MAPPED start_date_time VALUES ===")
-        logger.info(f"start_date_time data type: {df['start_date_time'].dtype}")
-        logger.info(f"start_date_time sample values:")
-        for i in range(min(5, len(df))):
-            val = df['start_date_time'].iloc[i]
-            logger.info(f"  Row {i}: '{val}' (type: {type(val)})")
-        
-        # Test parsing one value manually
-        if len(df) > 0:
-            test_value = df['start_date_time'].iloc[0]
-            logger.info(f"=== TESTING MANUAL PARSE ===")
-            logger.info(f"Test value: '{test_value}'")
-            
-            if pd.isna(test_value):
-                logger.error("Test value is NaN!")
-            elif test_value == '' or test_value == '-':
-                logger.error("Test value is empty or dash!")
-            else:
-                try:
-                    clean_str = str(test_value).replace(' @ ', ' ').strip()
-                    logger.info(f"Cleaned string: '{clean_str}'")
-                    
-                    parsed = pd.to_datetime(clean_str, errors='coerce')
-                    logger.info(f"Parsed result: {parsed}")
-                    logger.info(f"Parsed type: {type(parsed)}")
-                    
-                    if pd.isna(parsed):
-                        logger.error("Parsing resulted in NaT!")
-                        
-                        # Try alternative parsing methods
-                        logger.info("Trying alternative parsing methods...")
-                        
-                        try:
-                            # Try without milliseconds
-                            if '.000' in clean_str:
-                                clean_str2 = clean_str.replace('.000', '')
-                                parsed2 = pd.to_datetime(clean_str2, errors='coerce')
-                                logger.info(f"Without .000: '{clean_str2}' -> {parsed2}")
-                        except Exception as e:
-                            logger.info(f"Alternative parsing failed: {e}")
-                            
-                except Exception as e:
-                    logger.error(f"Manual parsing failed: {e}")
-        
-        # Now apply parsing to all rows with detailed logging
-        def parse_datetime_with_logging(dt_str):
-            if pd.isna(dt_str) or dt_str == '' or dt_str == '-':
-                return pd.NaT
-            
-            try:
-                clean_str = str(dt_str).replace(' @ ', ' ').strip()
-                parsed = pd.to_datetime(clean_str, errors='coerce')
-                return parsed
-            except Exception as e:
-                logger.warning(f"Parse failed for '{dt_str}': {e}")
-                return pd.NaT
-        
-        logger.info("=== APPLYING PARSING TO ALL ROWS ===")
-        df['appointment_datetime'] = df['start_date_time'].apply(parse_datetime_with_logging)
+        # Verbose sample dumps only at DEBUG level, and as one record each -
+        # per-row logger.info calls allocate and lock per line
+        if 'startDateTime' not in df.columns:
+            logger.error(f"startDateTime column NOT found! Available columns: {list(df.columns)}")
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("startDateTime dtype %s, samples:\n%s",
+                         df['startDateTime'].dtype, df['startDateTime'].head().to_string())
         
+        # Parse all start times in two vectorized passes instead of a
+        # Python-level apply per row. Kibana renders timestamps as
+        # 'Aug 20, 2025 @ 14:30:00.000'; matching the known format hits
+        # pandas' C parser, and only the rows that miss it (e.g. ISO strings
+        # from the API path) fall back to inference. Placeholders like ''
+        # and '-' coerce straight to NaT.
+        cleaned = df['startDateTime'].astype(str).str.replace(' @ ', ' ', regex=False).str.strip()
+        appointment_datetime = pd.to_datetime(cleaned, format='%b %d, %Y %H:%M:%S.%f', errors='coerce')
+        missed = appointment_datetime.isna()
+        if missed.any():
+            appointment_datetime[missed] = pd.to_datetime(cleaned[missed], errors='coerce')
+
         # Check results
-        valid_count = df['appointment_datetime'].notna().sum()
+        valid_count = appointment_datetime.notna().sum()
         logger.info(f"Successfully parsed {valid_count} out of {len(df)} values")
-        
+
         if valid_count > 0:
-            logger.info("Successfully parsed examples:")
-            success_mask = df['appointment_datetime'].notna()
-            success_df = df[success_mask]
-            for i in range(min(3, len(success_df))):
-                orig = success_df['start_date_time'].iloc[i]
-                parsed = success_df['appointment_datetime'].iloc[i]
-                logger.info(f"  '{orig}' -> {parsed}")
-                
-            # Create date/time fields
-            df['appointment_date'] = df['appointment_datetime'].dt.date
-            df['appointment_time'] = df['appointment_datetime'].dt.strftime('%H:%M')
-            df['appointment_time_12h'] = df['appointment_datetime'].dt.strftime('%I:%M %p')
+            if logger.isEnabledFor(logging.DEBUG):
+                success_mask = appointment_datetime.notna()
+                logger.debug("Parsed examples:\n%s",
+                             appointment_datetime[success_mask].head(3).to_string())
+
+            # Derive the date/time fields from a single cached .dt accessor;
+            # both time strings come out of one strftime traversal and are
+            # split apart afterwards instead of formatting the column twice
+            dt = appointment_datetime.dt
+            appointment_date = dt.date
+            both_times = dt.strftime('%H:%M|%I:%M %p').str.split('|', n=1, expand=True)
+            appointment_time = both_times[0]
+            appointment_time_12h = both_times[1]
         else:
             logger.error("NO VALUES WERE SUCCESSFULLY PARSED!")
-            df['appointment_date'] = None
-            df['appointment_time'] = None
-            df['appointment_time_12h'] = None
-        
-        # Clean up booking IDs - remove any non-numeric entries
-        if 'booking_id' in df.columns:
-            df['booking_id'] = df['booking_id'].astype(str)
-            # Filter out rows where booking_id is not a valid number
-            df = df[df['booking_id'].str.isdigit()]
-        
-        # Filter out canceled appointments if desired (optional)
-        if 'booking_status_label' in df.columns:
-            # Keep all statuses for now, but log the distribution
-            status_counts = df['booking_status_label'].value_counts()
-            logger.info(f"Status distribution: {status_counts.to_dict()}")
-        
-        # Add metadata
-        df['extracted_at'] = datetime.utcnow()
-        df['data_date'] = target_date.date() if target_date else datetime.now().date()
-        
-        # Convert data_date to string to avoid JSON serialization issues
-        df['data_date'] = df['data_date'].astype(str)
-        
-        # Select final columns for database - match our simple table structure
-        final_columns = [
-            'booking_id',
-            'time_column',
-            'location_business_name',
-            'location_business_id',
-            'client_last_name',
-            'is_google_booking',
-            'offering_name',
-            'client_first_name',
-            'client_email',
-            'booking_status_label',
-            'start_date_time',
-            'customer_name',
-            'appointment_datetime',
-            'appointment_date',
-            'appointment_time',
-            'appointment_time_12h',
-            'extracted_at',
-            'data_date'
-        ]
-        
-        # Only include columns that exist
-        available_columns = [col for col in final_columns if col in df.columns]
-        result_df = df[available_columns] if available_columns else df
-        
+            appointment_date = None
+            appointment_time = None
+            appointment_time_12h = None
+
+        # Build the output frame in a single construction instead of eleven
+        # column assignments plus a final reslice - each of those passes
+        # created another intermediate frame over all rows
+        logger.info("=== MAPPING COLUMNS ===")
+        result_df = pd.DataFrame({
+            'booking_id': df['bookingId'].astype(str),
+            'time_column': df['Time'],
+            'location_business_name': df['location.businessName'],
+            'location_business_id': df['location.businessId'],
+            'client_last_name': df['client.lastName'],
+            'is_google_booking': df['isGoogleBooking'],
+            'offering_name': df['offering.name'],
+            'client_first_name': df['client.firstName'],
+            'client_email': df['client.email'],
+            'booking_status_label': df['bookingStatus.label'],
+            'start_date_time': df['startDateTime'],
+            'customer_name': df['client.firstName'].fillna('').str.cat(
+                df['client.lastName'].fillna(''), sep=' ').str.strip(),
+            'appointment_datetime': appointment_datetime,
+            'appointment_date': appointment_date,
+            'appointment_time': appointment_time,
+            'appointment_time_12h': appointment_time_12h,
+            'extracted_at': pd.Timestamp.utcnow(),
+            'data_date': str(target_date.date() if target_date else datetime.now().date())
+        })
+
+        # Clean up booking IDs - remove any non-numeric entries. to_numeric
+        # runs the check in C instead of a per-row str.isdigit pass
+        result_df = result_df[pd.to_numeric(result_df['booking_id'], errors='coerce').notna()]
+
+        # Keep all statuses for now, but log the distribution
+        status_counts = result_df['booking_status_label'].value_counts()
+        logger.info(f"Status distribution: {status_counts.to_dict()}")
+
         # Remove any completely empty rows
         result_df = result_df.dropna(how='all')
-        
-        # Sort by appointment time if available
-        if 'appointment_datetime' in result_df.columns:
-            result_df = result_df.sort_values('appointment_datetime')
-        elif 'booking_id' in result_df.columns:
-            result_df = result_df.sort_values('booking_id')
+
+        # Drop duplicate bookings (pagination overlap repeats rows at chunk
+        # boundaries) - keep the last occurrence, which carries the latest
+        # status when Kibana shows the same booking twice
+        before_dedup = len(result_df)
+        result_df = result_df.drop_duplicates(subset=['booking_id'], keep='last')
+        if len(result_df) < before_dedup:
+            logger.info(f"Dropped {before_dedup - len(result_df)} duplicate booking rows")
+
+        # Sort by appointment time
+        result_df = result_df.sort_values('appointment_datetime')
         
         logger.info(f"Final processed DataFrame: {result_df.shape}")
         logger.info(f"Final columns: {list(result_df.columns)}")
         
-        if not result_df.empty:
-            logger.info(f"Sample row: {result_df.iloc[0].to_dict()}")
+        if not result_df.empty and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sample row: %s", result_df.iloc[0].to_dict())
         
         return result_df
     
@@ -689,43 +934,51 @@ class KibanaWebScraper:
             return
             
         try:
-            # Convert DataFrame to list of dictionaries
+            # Serialize column-wise instead of walking every cell in Python:
+            # datetime columns become ISO strings in one vectorized pass and
+            # any remaining NaN/NaT cells are nulled out in bulk, so the
+            # records from to_dict() are already JSON-ready
+            df = df.copy()
+
+            for col in df.select_dtypes(include=['datetime64[ns]', 'datetime64[ns, UTC]']).columns:
+                df[col] = df[col].dt.strftime('%Y-%m-%dT%H:%M:%S')
+
+            if 'appointment_date' in df.columns:
+                df['appointment_date'] = pd.to_datetime(df['appointment_date'], errors='coerce').dt.strftime('%Y-%m-%d')
+
+            df = df.astype(object).where(df.notna(), None)
             data_to_insert = df.to_dict('records')
             
-            # Convert datetime objects to strings for JSON serialization
-            for record in data_to_insert:
-                for key, value in record.items():
-                    if pd.isna(value):
-                        record[key] = None
-                    elif isinstance(value, (pd.Timestamp, datetime)):
-                        record[key] = value.isoformat()
-                    elif hasattr(value, 'date') and callable(getattr(value, 'date')):
-                        # Handle datetime.date objects
-                        record[key] = value.isoformat()
-                    elif isinstance(value, pd._libs.tslibs.nattype.NaTType):
-                        # Handle pandas NaT (Not a Time) values
-                        record[key] = None
-                    elif str(value) == 'NaT':
-                        # Handle string representations of NaT
-                        record[key] = None
-                    elif hasattr(value, 'isoformat'):
-                        # Handle any other datetime-like objects including datetime.date
-                        record[key] = value.isoformat()
-                    elif isinstance(value, (int, float, str, bool)) or value is None:
-                        # Keep simple types as-is
-                        record[key] = value
-                    else:
-                        # Convert anything else to string as fallback
-                        record[key] = str(value)
-            
-            # Method 1: Try upsert with just booking_id as the conflict key
+            # Method 1: Upsert in ~500-row chunks dispatched concurrently -
+            # one fat request risks statement timeouts on large days, and the
+            # thread pool overlaps the HTTP round-trips
             try:
-                result = self.supabase.table('daily_appointments').upsert(
-                    data_to_insert,
-                    on_conflict='booking_id'
-                ).execute()
-                
-                logger.info(f"Successfully upserted {len(data_to_insert)} records to Supabase")
+                chunks = [data_to_insert[i:i + 500] for i in range(0, len(data_to_insert), 500)]
+
+                def upsert_chunk(indexed_chunk):
+                    index, chunk = indexed_chunk
+                    try:
+                        # return=minimal: we never read the echoed rows, so
+                        # skip PostgREST serializing them back to us
+                        return self.supabase.table('daily_appointments').upsert(
+                            chunk,
+                            on_conflict='booking_id',
+                            returning='minimal'
+                        ).execute()
+                    except Exception as chunk_error:
+                        # Name the offending chunk so a single bad batch is
+                        # diagnosable instead of failing the whole day opaquely
+                        logger.error(f"Upsert failed for chunk {index} ({len(chunk)} rows): {chunk_error}")
+                        raise
+
+                if len(chunks) == 1:
+                    result = upsert_chunk((0, chunks[0]))
+                else:
+                    with ThreadPoolExecutor(max_workers=8) as executor:
+                        results = list(executor.map(upsert_chunk, enumerate(chunks)))
+                    result = results[-1]
+
+                logger.info(f"Successfully upserted {len(data_to_insert)} records to Supabase in {len(chunks)} chunk(s)")
                 return result
                 
             except Exception as upsert_error:
@@ -775,100 +1028,217 @@ class KibanaWebScraper:
             target_date = datetime.now()
         
         logger.info(f"Starting web scraping for {target_date.date()}")
-        
-        async with async_playwright() as p:
-            # Launch browser with debugging options
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-web-security',
-                    '--disable-features=VizDisplayCompositor'
-                ]
-            )
-            
-            context = await browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
-            
-            page = await context.new_page()
-            
+
+        # Fast path: the JSON API returns the same hits in well under a
+        # second, so only fall back to a full browser scrape when it fails
+        raw_appointments = await self.fetch_appointments_via_api()
+        if raw_appointments:
+            # Processing API hits can raise (sparse fields from
+            # json_normalize leave whole columns missing) - treat that like
+            # an empty result and fall through to the browser scrape instead
+            # of leaking the exception out of the run
             try:
-                # Step 1: Login to Kibana
-                await self.login_to_kibana(page)
-                logger.info("Login completed successfully")
-                
-                # Step 2: Navigate to discover page with 15-day data
-                await self.navigate_to_discover(page, target_date)
-                
-                # Step 3: Extract appointment data
-                raw_appointments = await self.extract_appointment_data(page)
-                
-                # Check if we actually got data
-                if not raw_appointments:
-                    # Take final screenshot for debugging
-                    await page.screenshot(path='final_no_data.png')
-                    
-                    logger.error("No appointment data was extracted from the page")
-                    return {
-                        'status': 'error',
-                        'error': 'No appointment data found on the page',
-                        'date': target_date.date().isoformat(),
-                        'url': page.url
-                    }
-                
-                # Step 4: Process the data
-                processed_df = self.process_appointment_data(raw_appointments, target_date)
-                
-                if not processed_df.empty:
-                    # Step 5: Save to Supabase
-                    self.save_to_supabase(processed_df)
-                    
-                    logger.info("Daily scraping completed successfully")
+                # Retries and manual replays often re-fetch identical data - if
+                # the content hash matches the last successful run for this date,
+                # the rows are already in Supabase
+                raw_hash = self._raw_hash(raw_appointments)
+                cached_count = self._check_scrape_cache(target_date, raw_hash)
+                if cached_count is not None:
+                    logger.info("Raw data unchanged since last successful run - skipping process/upload")
                     return {
                         'status': 'success',
-                        'records_processed': len(processed_df),
+                        'records_processed': cached_count,
                         'raw_records_found': len(raw_appointments),
                         'date': target_date.date().isoformat(),
-                        'url': page.url
+                        'url': f"{self.kibana_base_url}/internal/search/es"
                     }
-                else:
-                    logger.warning("Raw data found but no records after processing/filtering")
+
+                processed_df = self.process_appointment_data(raw_appointments, target_date)
+
+                # Measure once, reuse in the branch and the result dict
+                n_processed = len(processed_df)
+                if n_processed:
+                    # Run the sync Supabase client off the event loop so concurrent
+                    # scrapes in run_many are not blocked by the upload
+                    await asyncio.to_thread(self.save_to_supabase, processed_df)
+                    self._store_scrape_cache(target_date, raw_hash, n_processed)
+
+                    logger.info("Daily scraping completed successfully (API path)")
                     return {
-                        'status': 'warning',
-                        'records_processed': 0,
+                        'status': 'success',
+                        'records_processed': n_processed,
                         'raw_records_found': len(raw_appointments),
                         'date': target_date.date().isoformat(),
-                        'message': 'Data found but no records for target date after filtering',
-                        'url': page.url
+                        'url': f"{self.kibana_base_url}/internal/search/es"
                     }
-                    
+
+                logger.warning("API rows did not survive processing - trying browser scrape")
             except Exception as e:
-                logger.error(f"Scraping failed: {e}")
-                
-                # Take final error screenshot
-                try:
-                    await page.screenshot(path='scraping_final_error.png')
-                    current_url = page.url
-                except:
-                    current_url = "Unable to get URL"
+                logger.warning(f"API path processing failed ({e}) - trying browser scrape")
+
+        # Reuse the long-lived browser; only the page is per-run. Count the
+        # page before opening it so a sibling run finishing right now can't
+        # recycle the context out from under a new_page() still in flight
+        await self.start()
+        self._active_pages += 1
+        try:
+            page = await self._context.new_page()
+        except Exception:
+            self._active_pages -= 1
+            raise
+
+        try:
+            # Step 1: Login to Kibana
+            await self.login_to_kibana(page)
+            logger.info("Login completed successfully")
+            
+            # Steps 2-3: Navigate to discover and extract, with backoff on
+            # transient failures - the browser and login survive between
+            # attempts so a retry costs one navigation, not a cold start
+            async def navigate_and_extract():
+                await self.navigate_to_discover(page, target_date)
+                return await self.extract_appointment_data(page)
+
+            raw_appointments = await self._with_retry(navigate_and_extract)
+
+            # page.url is an IPC round trip to the browser; read it once and
+            # reuse it in every return branch below
+            current_url = page.url
+
+            # Check if we actually got data
+            if not raw_appointments:
+                # Take final screenshot for debugging
+                await page.screenshot(path='final_no_data.png')
                 
+                logger.error("No appointment data was extracted from the page")
                 return {
                     'status': 'error',
-                    'error': str(e),
+                    'error': 'No appointment data found on the page',
                     'date': target_date.date().isoformat(),
                     'url': current_url
                 }
-            finally:
-                await browser.close()
+            
+            # Same unchanged-data short-circuit as the API path
+            raw_hash = self._raw_hash(raw_appointments)
+            cached_count = self._check_scrape_cache(target_date, raw_hash)
+            if cached_count is not None:
+                logger.info("Raw data unchanged since last successful run - skipping process/upload")
+                return {
+                    'status': 'success',
+                    'records_processed': cached_count,
+                    'raw_records_found': len(raw_appointments),
+                    'date': target_date.date().isoformat(),
+                    'url': current_url
+                }
+
+            # Step 4: Process the data
+            processed_df = self.process_appointment_data(raw_appointments, target_date)
+
+            # Measure once, reuse in the branch and the result dict
+            n_processed = len(processed_df)
+            if n_processed:
+                # Step 5: Save to Supabase
+                # Run the sync Supabase client off the event loop so concurrent
+                # scrapes in run_many are not blocked by the upload
+                await asyncio.to_thread(self.save_to_supabase, processed_df)
+                self._store_scrape_cache(target_date, raw_hash, n_processed)
+
+                logger.info("Daily scraping completed successfully")
+                return {
+                    'status': 'success',
+                    'records_processed': n_processed,
+                    'raw_records_found': len(raw_appointments),
+                    'date': target_date.date().isoformat(),
+                    'url': current_url
+                }
+            else:
+                logger.warning("Raw data found but no records after processing/filtering")
+                return {
+                    'status': 'warning',
+                    'records_processed': 0,
+                    'raw_records_found': len(raw_appointments),
+                    'date': target_date.date().isoformat(),
+                    'message': 'Data found but no records for target date after filtering',
+                    'url': current_url
+                }
+                
+        except Exception as e:
+            logger.error(f"Scraping failed: {e}")
+
+            # Take final error screenshot, but bound it - a wedged browser
+            # can hang the screenshot call and stretch the outage window.
+            # JPEG at quality 60 is ~10x smaller than PNG and encodes faster
+            try:
+                await asyncio.wait_for(
+                    page.screenshot(path='scraping_final_error.jpg', type='jpeg', quality=60),
+                    timeout=3
+                )
+                current_url = page.url
+            except:
+                current_url = "Unable to get URL"
+            
+            return {
+                'status': 'error',
+                'error': str(e),
+                'date': target_date.date().isoformat(),
+                'url': current_url
+            }
+        finally:
+            await page.close()
+            self._active_pages -= 1
+            await self._recycle_context_if_needed()
+
+    async def run_many(self, dates):
+        """Run scrapes for several dates concurrently - pages share the one
+        long-lived authenticated context, and the semaphore caps open pages
+        at 5 to keep browser memory bounded"""
+        await self.start()
+        semaphore = asyncio.Semaphore(5)
+
+        async def run_one(target_date):
+            async with semaphore:
+                return await self.run_daily_scraping(target_date)
+
+        return await asyncio.gather(*(run_one(d) for d in dates), return_exceptions=True)
+
+def _backfill_worker(dates):
+    """Entry point for one backfill worker process - runs its own event loop
+    and its own long-lived browser"""
+    async def run():
+        scraper = KibanaWebScraper()
+        # Chromium locks its profile dir, so each worker needs its own
+        scraper.user_data_dir = f"{scraper.user_data_dir}-{os.getpid()}"
+        try:
+            return await scraper.run_many(list(dates))
+        finally:
+            await scraper.stop()
+
+    return asyncio.run(run())
+
+def run_backfill(date_list, n_workers=4):
+    """Split a large backfill across worker processes. Each worker drives its
+    own asyncio loop and Chromium, so DataFrame work runs on separate GILs
+    and no single Playwright driver becomes the bottleneck."""
+    chunks = [date_list[i::n_workers] for i in range(n_workers)]
+    chunks = [chunk for chunk in chunks if chunk]
+
+    with ProcessPoolExecutor(len(chunks)) as executor:
+        worker_results = list(executor.map(_backfill_worker, chunks))
+
+    return [result for results in worker_results for result in results]
 
 async def main():
     """Main entry point"""
     scraper = KibanaWebScraper()
-    result = await scraper.run_daily_scraping()
-    
-    print(f"Scraping result: {json.dumps(result, indent=2)}")
-    
+    try:
+        result = await scraper.run_daily_scraping()
+    finally:
+        await scraper.stop()
+
+    # Compact JSON through the logger - pretty-printing to stdout can block
+    # the final flush in containerized runners, and one line greps better
+    logger.info("scrape_result=%s", json.dumps(result, separators=(',', ':'), default=str))
+
     if result['status'] == 'error':
         exit(1)
 